@@ -1,113 +1,235 @@
 import os
-from typing import Dict, Any
+import sys
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Optional
 from fastapi import FastAPI, HTTPException
-from langchain.chat_models import ChatOpenAI
+from fastapi.responses import StreamingResponse
+from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.memory import MemorySaver
+import httpx
 from loguru import logger
+import orjson
 from dotenv import load_dotenv
-from pydantic import ValidationError
 
 from cooking.models import CookingQuery, CookingResponse, AgentState
 from cooking.agents import create_cooking_graph
+from cooking.cache import query_key
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
+# Configure logging; debug output is opt-in via LOG_LEVEL=DEBUG
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logger.remove()
+logger.add(sys.stderr, level=LOG_LEVEL)
 logger.add(
     "cooking_assistant.log",
     rotation="500 MB",
-    level="INFO",
+    level=LOG_LEVEL,
     format="{time} | {level} | {module}:{function}:{line} - {message}"
 )
 
+# Number of completed workflow runs kept in the checkpointer per worker
+MAX_CACHED_THREADS = 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Initialize the LLM and workflow graph.
+    
+    Runs once per worker process, so each uvicorn worker builds its own
+    client and connection pool after it has been started. The HTTP client is
+    shared by the OpenAI calls and recipe searches and closed on shutdown.
+    Completed runs are checkpointed in memory, so they are per worker too;
+    use SqliteSaver or a Redis-backed saver to share them across workers.
+    """
+    async with httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=50, keepalive_expiry=120)
+    ) as http_client:
+        try:
+            if not os.getenv("OPENAI_API_KEY"):
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+                
+            llm = ChatOpenAI(
+                temperature=0.7,
+                model="gpt-4o-mini",
+                http_async_client=http_client
+            )
+            app.state.checkpointer = MemorySaver()
+            app.state.recent_threads = OrderedDict()
+            app.state.cooking_graph = create_cooking_graph(llm, http_client, app.state.checkpointer)
+            logger.info("Successfully initialized LLM and workflow graph")
+        except Exception as e:
+            logger.error("Failed to initialize application: {}", e)
+            raise
+        yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Cooking Assistant API",
     description="An AI-powered cooking assistant that helps with recipes and cooking advice",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Initialize LLM and workflow graph
-try:
-    if not os.getenv("OPENAI_API_KEY"):
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-        
-    llm = ChatOpenAI(
-        temperature=0.7,
-        model="gpt-3.5-turbo"
+def _response_from_state(final_state: Dict[str, Any]) -> CookingResponse:
+    """Build the API response from the workflow's final state.
+    
+    The graph nodes already produce correctly typed values, so the model is
+    constructed without re-running validation.
+    """
+    return CookingResponse.model_construct(
+        response=final_state["final_response"] or "No response generated",
+        relevant=final_state["is_cooking_related"],
+        reasoning_chain=final_state["reasoning_chain"]
     )
-    cooking_graph = create_cooking_graph(llm)
-    logger.info("Successfully initialized LLM and workflow graph")
-except Exception as e:
-    logger.error(f"Failed to initialize application: {str(e)}")
-    raise
 
-async def generate_cooking_response(query: str) -> Dict[str, Any]:
+def _thread_config(query: str) -> Dict[str, Any]:
+    """Build the graph config whose thread_id identifies a normalized query."""
+    thread_id = hashlib.blake2b(query_key(query).encode()).hexdigest()
+    return {"configurable": {"thread_id": thread_id}}
+
+async def _completed_state(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the final state of a finished run for this thread, if any.
+    
+    Invoking a checkpointed thread with new input starts the graph over, so
+    a finished run is looked up with aget_state before invoking at all.
+    """
+    snapshot = await app.state.cooking_graph.aget_state(config)
+    if snapshot.values and not snapshot.next:
+        return snapshot.values
+    return None
+
+async def _settle_thread(config: Dict[str, Any], final_state: Optional[Dict[str, Any]]) -> None:
+    """Keep a run's checkpoint for reuse, dropping the least recently used ones.
+    
+    Runs that failed, whose classification couldn't be parsed, or that
+    needed research but ended without a recipe (e.g. because the search was
+    down), are deleted instead so an identical query runs again rather than
+    being served the degraded answer.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    recent_threads = app.state.recent_threads
+    if (
+        not final_state
+        or final_state.get("classification_failed")
+        or (final_state.get("needs_research") and final_state.get("recipe") is None)
+    ):
+        recent_threads.pop(thread_id, None)
+        await app.state.checkpointer.adelete_thread(thread_id)
+        return
+    recent_threads[thread_id] = None
+    recent_threads.move_to_end(thread_id)
+    while len(recent_threads) > MAX_CACHED_THREADS:
+        old_thread_id, _ = recent_threads.popitem(last=False)
+        await app.state.checkpointer.adelete_thread(old_thread_id)
+
+async def generate_cooking_response(query: str) -> CookingResponse:
     """Generate a response for a cooking-related query using the workflow graph.
     
     Args:
         query: The user's cooking-related question
         
     Returns:
-        Dict containing response, relevance, and reasoning chain
+        CookingResponse containing response, relevance, and reasoning chain
     """
     try:
         # Initialize agent state with query
         state = AgentState(query=query)
-        logger.debug(f"Created initial state: {dict(state)}")
+        logger.debug("Created initial state for query: {:.80}", state.query)
         
-        # Execute workflow
+        # Execute workflow, reusing the final state of an identical query
         try:
-            final_state = cooking_graph.invoke(state)
-            logger.debug(f"Workflow final state: {dict(final_state)}")
+            config = _thread_config(query)
+            final_state = None
+            try:
+                final_state = await _completed_state(config)
+                if final_state is None:
+                    final_state = await app.state.cooking_graph.ainvoke(state, config)
+            finally:
+                await _settle_thread(config, final_state)
+            logger.opt(lazy=True).debug("Workflow final state: {}", lambda: final_state)
         except Exception as workflow_error:
             logger.error("Error executing workflow", exc_info=True)
             raise RuntimeError(f"Workflow execution failed: {str(workflow_error)}") from workflow_error
         
         # Ensure we have the required fields
         if not isinstance(final_state, dict):
-            logger.error(f"Expected dict state, got {type(final_state)}")
+            logger.error("Expected dict state, got {}", type(final_state))
             raise TypeError(f"Invalid state type: {type(final_state)}")
             
-        # Extract values from state with detailed logging
-        response_data = {
-            "response": str(final_state.get("final_response", "No response generated")),
-            "relevant": bool(final_state.get("is_cooking_related", False)),
-            "reasoning_chain": list(final_state.get("reasoning_chain", []))
-        }
-        logger.debug(f"Extracted response data: {response_data}")
-        return response_data
+        return _response_from_state(final_state)
         
     except Exception as e:
         logger.error("Error generating cooking response", exc_info=True)
         # Re-raise with context but preserve original error
         raise ValueError(f"Failed to generate response: {str(e)}") from e
 
+def _sse_event(payload: Dict[str, Any]) -> str:
+    """Format a payload as a server-sent event."""
+    return "data: " + orjson.dumps(payload).decode() + "\n\n"
+
+async def stream_cooking_response(query: str) -> AsyncIterator[str]:
+    """Stream the response to a query as server-sent events.
+    
+    Tokens of the final answer are sent as "token" events while the LLM
+    generates them, followed by a single "final" event carrying the complete
+    response, relevance flag and reasoning chain.
+    
+    Args:
+        query: The user's cooking-related question
+        
+    Yields:
+        SSE-formatted event strings
+    """
+    try:
+        state = AgentState(query=query)
+        config = _thread_config(query)
+        final_state = None
+        try:
+            final_state = await _completed_state(config)
+            if final_state is None:
+                async for event in app.state.cooking_graph.astream_events(state, config, version="v2"):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "respond":
+                        token = event["data"]["chunk"].content
+                        if token:
+                            yield _sse_event({"type": "token", "content": token})
+                    elif kind == "on_chain_end" and not event["parent_ids"]:
+                        # End of the top-level graph run
+                        final_state = event["data"]["output"]
+        finally:
+            await _settle_thread(config, final_state)
+        if final_state is None:
+            raise RuntimeError("Workflow finished without a final state")
+        
+        cooking_response = _response_from_state(final_state)
+        yield _sse_event({"type": "final", **cooking_response.model_dump()})
+        
+    except Exception as e:
+        logger.exception("Error streaming cooking query")
+        error_response = CookingResponse(
+            response=f"Error processing query: {str(e)}",
+            relevant=False,
+            reasoning_chain=["Error occurred", str(e)]
+        )
+        yield _sse_event({"type": "error", **error_response.model_dump()})
+
 @app.post("/cooking/query", response_model=CookingResponse)
 async def process_cooking_query(query: CookingQuery) -> CookingResponse:
-    """Process a cooking-related query."""
+    """Process a cooking-related query.
+    
+    The CookingResponse instance is returned as is; FastAPI accepts it for
+    response_model without re-validating its fields and serializes it
+    straight to JSON with pydantic-core.
+    """
     try:
         # Get response from cooking agent
-        response = await generate_cooking_response(query.query)
-        
-        # Create response object with validation
-        try:
-            cooking_response = CookingResponse(
-                response=response.get("response", "No response generated"),
-                relevant=response.get("relevant", False),
-                reasoning_chain=response.get("reasoning_chain", [])
-            )
-            logger.info(f"Successfully created CookingResponse: {cooking_response.dict()}")
-            return cooking_response
-            
-        except ValidationError as ve:
-            logger.error(f"Validation error creating CookingResponse: {ve}")
-            # Attempt to create a fallback response
-            return CookingResponse(
-                response=str(response.get("response", "Error processing response")),
-                relevant=bool(response.get("relevant", False)),
-                reasoning_chain=["Error in response validation", str(ve)]
-            )
+        cooking_response = await generate_cooking_response(query.query)
+        logger.info("Successfully created CookingResponse (relevant={})", cooking_response.relevant)
+        return cooking_response
             
     except Exception as e:
         logger.exception("Error processing cooking query")
@@ -118,6 +240,21 @@ async def process_cooking_query(query: CookingQuery) -> CookingResponse:
             reasoning_chain=["Error occurred", str(e)]
         )
 
+@app.post("/cooking/query/stream")
+async def stream_cooking_query(query: CookingQuery) -> StreamingResponse:
+    """Process a cooking-related query, streaming the answer as it is generated."""
+    return StreamingResponse(
+        stream_cooking_response(query.query),
+        media_type="text/event-stream"
+    )
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools"
+    ) 
\ No newline at end of file
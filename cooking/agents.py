@@ -1,75 +1,90 @@
-from typing import Annotated, Sequence, TypedDict, Union
-from langchain.chat_models import ChatOpenAI
+from typing import Annotated, Optional, Sequence, TypedDict, Union
+import asyncio
+import httpx
+from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import Graph, StateGraph
 from loguru import logger
 from .models import AgentState, ToolSet
-from .tools import create_tools
+from .tools import create_tools, keyword_classify
 
-def create_cooking_graph(llm: ChatOpenAI) -> Graph:
-    """Create the cooking assistant workflow graph."""
+def create_cooking_graph(
+    llm: ChatOpenAI,
+    http_client: httpx.AsyncClient,
+    checkpointer: Optional[BaseCheckpointSaver] = None
+) -> Graph:
+    """Create the cooking assistant workflow graph.
+    
+    When a checkpointer is given, each run's state is saved under the
+    thread_id in its config so a finished run can be looked up again.
+    """
     
     # Create tools
-    tools = create_tools(llm)
+    tools = create_tools(llm, http_client)
     toolset = ToolSet()
     
     # Define workflow steps
-    def classify_query(state: AgentState) -> AgentState:
-        """Determine if the query is cooking-related."""
-        try:
-            logger.info(f"Classifying query: {state.query}")
-            is_cooking = tools[0].func(state.query)
-            state.is_cooking_related = is_cooking
-            state.reasoning_chain.append(
-                f"Query classification: {'cooking-related' if is_cooking else 'not cooking-related'}"
-            )
-            logger.info(f"Query classified as: {'cooking-related' if is_cooking else 'not cooking-related'}")
-            return state
-        except Exception as e:
-            logger.error(f"Error in classify_query: {str(e)}")
-            raise
+    async def classify_query(state: AgentState) -> AgentState:
+        """Classify the query while speculatively searching for recipes.
 
-    def check_research_needed(state: AgentState) -> AgentState:
-        """Check if research is needed."""
+        Obvious queries are classified from keywords first and only searched
+        for when they need research. Otherwise the search only depends on the
+        raw query, so it starts alongside the LLM classification call. It is
+        only awaited when the query turns out to need research and is
+        cancelled otherwise, so rejected queries never wait on the search.
+        """
+        search = None
         try:
-            if not state.is_cooking_related:
-                logger.info("Skipping research check for non-cooking query")
+            logger.info("Classifying query: {:.80}", state.query)
+            decision = keyword_classify(state.query)
+            if decision is None:
+                search = asyncio.create_task(tools[1].coroutine(state.query))
+                # Retrieve the outcome of searches that are never awaited so a
+                # failed one isn't reported as an unhandled task exception
+                search.add_done_callback(lambda task: task.cancelled() or task.exception())
+                decision = await tools[0].coroutine(state.query)
+            if decision is None:
+                # Unparseable classification; answer without claiming the
+                # query is off-topic and mark the run so it isn't reused
+                state.classification_failed = True
+                state.reasoning_chain.append("Query classification failed")
+                logger.warning("Query classification failed")
                 return state
-                
-            logger.info("Checking if research is needed")
-            needs_research = tools[1].func(state.query)
+            is_cooking, needs_research = decision
+            results = []
+            if needs_research:
+                try:
+                    results = await (search or tools[1].coroutine(state.query))
+                except Exception as e:
+                    logger.warning("Recipe search failed: {}", e)
+
+            state.is_cooking_related = is_cooking
             state.needs_research = needs_research
+            state.research_results = results
             state.reasoning_chain.append(
-                f"Research {'needed' if needs_research else 'not needed'}"
+                f"Query classification: {'cooking-related' if is_cooking else 'not cooking-related'}"
             )
-            logger.info(f"Research needed: {needs_research}")
+            logger.info("Query classified as: {}", "cooking-related" if is_cooking else "not cooking-related")
+            if is_cooking:
+                state.reasoning_chain.append(
+                    f"Research {'needed' if needs_research else 'not needed'}"
+                )
+                logger.info("Research needed: {}", needs_research)
+            if needs_research:
+                if results:
+                    state.reasoning_chain.append("Performed recipe research")
+                    logger.info("Found {} research results", len(results))
+                else:
+                    logger.warning("No research results found")
             return state
         except Exception as e:
-            logger.error(f"Error in check_research_needed: {str(e)}")
+            logger.error("Error in classify_query: {}", e)
             raise
+        finally:
+            if search is not None:
+                search.cancel()
 
-    def do_research(state: AgentState) -> AgentState:
-        """Perform recipe research."""
-        try:
-            if not state.needs_research:
-                logger.info("Skipping research - not needed")
-                return state
-                
-            logger.info("Performing recipe research")
-            results = tools[2].func(state.query)
-            if not results:
-                logger.warning("No research results found")
-                state.research_results = []
-                return state
-                
-            state.research_results = results
-            state.reasoning_chain.append("Performed recipe research")
-            logger.info(f"Found {len(results)} research results")
-            return state
-        except Exception as e:
-            logger.error(f"Error in do_research: {str(e)}")
-            raise
-
-    def parse_results(state: AgentState) -> AgentState:
+    async def parse_results(state: AgentState) -> AgentState:
         """Parse research results into a recipe."""
         try:
             if not state.research_results:
@@ -77,28 +92,31 @@ def create_cooking_graph(llm: ChatOpenAI) -> Graph:
                 return state
                 
             logger.info("Parsing research results into recipe")
-            recipe = tools[3].func(state.research_results)
+            recipe = await tools[2].coroutine(state.research_results)
             state.recipe = recipe
             state.reasoning_chain.append(
                 f"Recipe {'parsed successfully' if recipe else 'parsing failed'}"
             )
-            logger.info(f"Recipe parsing {'successful' if recipe else 'failed'}")
+            logger.info("Recipe parsing {}", "successful" if recipe else "failed")
             return state
         except Exception as e:
-            logger.error(f"Error in parse_results: {str(e)}")
+            logger.error("Error in parse_results: {}", e)
             raise
 
-    def generate_response(state: AgentState) -> AgentState:
+    async def generate_response(state: AgentState) -> AgentState:
         """Generate the final response."""
         try:
             logger.info("Generating final response")
+            if state.classification_failed:
+                state.final_response = "Sorry, I couldn't process your question right now. Please try again in a moment."
+                return state
             if not state.is_cooking_related:
                 logger.info("Generating non-cooking response")
                 state.final_response = "I apologize, but I can only help with cooking-related questions. Please ask me about recipes, cooking techniques, or kitchen tools."
                 return state
                 
             logger.info("Generating cooking response")
-            response = tools[4].func(state.query, state.recipe, toolset)
+            response = await tools[3].coroutine(state.query, state.recipe, toolset)
             if not response:
                 logger.error("Failed to generate response")
                 raise ValueError("Response generation failed")
@@ -108,23 +126,27 @@ def create_cooking_graph(llm: ChatOpenAI) -> Graph:
             logger.info("Response generated successfully")
             return state
         except Exception as e:
-            logger.error(f"Error in generate_response: {str(e)}")
+            logger.error("Error in generate_response: {}", e)
             raise
 
+    def route_after_classify(state: AgentState) -> str:
+        """Send queries that need no research straight to the response step."""
+        return "parse" if state.is_cooking_related and state.needs_research else "respond"
+
     # Create the workflow graph
     workflow = StateGraph(AgentState)
     
     # Add nodes
     workflow.add_node("classify", classify_query)
-    workflow.add_node("check_research", check_research_needed)
-    workflow.add_node("research", do_research)
     workflow.add_node("parse", parse_results)
     workflow.add_node("respond", generate_response)
     
     # Add edges
-    workflow.add_edge("classify", "check_research")
-    workflow.add_edge("check_research", "research")
-    workflow.add_edge("research", "parse")
+    workflow.add_conditional_edges(
+        "classify",
+        route_after_classify,
+        {"parse": "parse", "respond": "respond"}
+    )
     workflow.add_edge("parse", "respond")
     
     # Set entry and end points
@@ -132,4 +154,4 @@ def create_cooking_graph(llm: ChatOpenAI) -> Graph:
     workflow.set_finish_point("respond")
     
     logger.info("Workflow graph created successfully")
-    return workflow.compile() 
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer) 
\ No newline at end of file
@@ -0,0 +1,73 @@
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+import asyncio
+import contextvars
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+class AdaptiveBatcher(Generic[T, R]):
+    """Collect concurrent requests and process them as a single batch.
+
+    A batch is flushed as soon as it holds max_batch_size items, or
+    max_latency_ms after its first item arrived, whichever comes first.
+    Under light load a request waits at most max_latency_ms; under heavy
+    load batches fill up and are sent immediately.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch_size: int = 16,
+        max_latency_ms: float = 20
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        """Queue an item and wait for its result from the batch it lands in."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_latency_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """Hand the pending items to a background task as one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # Run in an empty context: a batch serves many callers, so it must not
+        # inherit the tracing/callback context of the one that triggered it
+        task = asyncio.create_task(self._run(batch), context=contextvars.Context())
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        """Process a batch and fan the results out to the waiting callers."""
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Expected {len(batch)} batch results, got {len(results)}")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
\ No newline at end of file
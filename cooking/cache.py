@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Tuple
+import hashlib
+import time
+
+_MISSING = object()
+
+class LRUCache:
+    """Bounded in-process cache that evicts the least recently used entry.
+
+    When ttl is given, entries older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, marking it as recently used."""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        expires_at, value = self._data[key]
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the oldest entry when the cache is full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+def query_key(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    return " ".join(query.lower().split())
+
+def results_key(research_results: List[str]) -> str:
+    """Hash research results into a compact cache key."""
+    return hashlib.blake2b("\n".join(research_results).encode()).hexdigest()
+
+def cached(
+    func: Callable[[Any], Awaitable[Any]],
+    key: Callable[[Any], Hashable],
+    maxsize: int = 4096,
+    ttl: Optional[float] = None
+) -> Callable[[Any], Awaitable[Any]]:
+    """Memoize a single-argument coroutine function in an LRU cache.
+
+    None and empty results are not cached so that transient failures are retried.
+    """
+    cache = LRUCache(maxsize, ttl)
+
+    async def wrapper(arg: Any) -> Optional[Any]:
+        cache_key = key(arg)
+        value = cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = await func(arg)
+        if value:
+            cache.set(cache_key, value)
+        return value
+
+    wrapper.cache = cache
+    return wrapper
\ No newline at end of file
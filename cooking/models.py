@@ -1,11 +1,15 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field, validator
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, FrozenSet, List, Literal, Optional
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_validator
 
 class CookingQuery(BaseModel):
     """Input query model."""
     query: str = Field(..., description="The cooking-related query")
 
-    @validator("query")
+    @field_validator("query")
+    @classmethod
     def validate_query(cls, v: str) -> str:
         """Ensure query is not empty."""
         if not v.strip():
@@ -14,6 +18,11 @@ class CookingQuery(BaseModel):
 
 class CookingResponse(BaseModel):
     """API response model."""
+    model_config = ConfigDict(
+        extra="ignore",  # Ignore extra fields
+        str_strip_whitespace=True  # Strip whitespace from strings
+    )
+
     response: str = Field(
         ...,
         description="The generated response",
@@ -28,7 +37,8 @@ class CookingResponse(BaseModel):
         description="Steps taken to generate the response"
     )
 
-    @validator("response")
+    @field_validator("response", mode="before")
+    @classmethod
     def validate_response(cls, v: str) -> str:
         """Ensure response is not empty and is a string."""
         if not isinstance(v, str):
@@ -38,7 +48,8 @@ class CookingResponse(BaseModel):
             v = "No response generated"
         return v
 
-    @validator("reasoning_chain")
+    @field_validator("reasoning_chain", mode="before")
+    @classmethod
     def validate_reasoning_chain(cls, v: List[str]) -> List[str]:
         """Ensure reasoning chain contains valid strings."""
         if not v:
@@ -46,48 +57,43 @@ class CookingResponse(BaseModel):
         # Convert any non-string items to strings
         return [str(item).strip() for item in v if item]
 
-    class Config:
-        """Pydantic model configuration."""
-        validate_assignment = True
-        extra = "ignore"  # Ignore extra fields
-        str_strip_whitespace = True  # Strip whitespace from strings
-        arbitrary_types_allowed = True  # Allow arbitrary types
-
 class Recipe(BaseModel):
     """Recipe model with all required fields."""
+    model_config = ConfigDict(frozen=True)  # Immutable so json_cache can't go stale
+
+    # Constraints are declared on the fields so they appear in the JSON schema
+    # the recipe parser sends to the LLM
     name: str
     ingredients: List[str]
     steps: List[str]
     required_tools: List[str]
-    cooking_time: str
-    difficulty: str
-    servings: int
-
-    @validator("difficulty")
-    def validate_difficulty(cls, v: str) -> str:
-        """Ensure difficulty is one of the allowed values."""
-        allowed = {"easy", "medium", "hard"}
-        v = v.lower()
-        if v not in allowed:
-            raise ValueError(f"Difficulty must be one of: {', '.join(allowed)}")
-        return v
+    cooking_time: str = Field(..., description="Total cooking time in minutes, e.g. '20 minutes'")
+    difficulty: Literal["easy", "medium", "hard"]
+    servings: int = Field(..., ge=1, description="Number of servings, at least 1")
 
-    @validator("servings")
-    def validate_servings(cls, v: int) -> int:
-        """Ensure servings is positive."""
-        if v < 1:
-            raise ValueError("Servings must be a positive number")
-        return v
+    @field_validator("difficulty", mode="before")
+    @classmethod
+    def validate_difficulty(cls, v: Any) -> Any:
+        """Accept difficulty values in any letter case."""
+        return v.lower() if isinstance(v, str) else v
 
-    @validator("cooking_time")
+    @field_validator("cooking_time")
+    @classmethod
     def validate_cooking_time(cls, v: str) -> str:
         """Ensure cooking time ends with 'minutes'."""
         if not v.strip().endswith("minutes"):
             v = v.strip() + " minutes"
         return v
 
+    @cached_property
+    def json_cache(self) -> str:
+        """JSON serialization of the recipe, computed once per instance."""
+        return orjson.dumps(self.model_dump()).decode()
+
 class ToolSet(BaseModel):
     """Available kitchen tools."""
+    model_config = ConfigDict(frozen=True)  # Immutable so _available_lower can't go stale
+
     available_tools: List[str] = [
         "Spatula",
         "Frying Pan", 
@@ -99,20 +105,30 @@ class ToolSet(BaseModel):
         "Spoon"
     ]
 
+    _available_lower: FrozenSet[str] = PrivateAttr(default=frozenset())
+
+    def model_post_init(self, __context: Any) -> None:
+        """Precompute the lowercased tool names used for recipe checks."""
+        self._available_lower = frozenset(tool.lower() for tool in self.available_tools)
+
     def can_cook_recipe(self, recipe: Optional[Recipe]) -> bool:
         """Check if all required tools for a recipe are available."""
         if not recipe:
             return True
-        required_tools = set(tool.lower() for tool in recipe.required_tools)
-        available_tools = set(tool.lower() for tool in self.available_tools)
-        return required_tools.issubset(available_tools)
+        return all(tool.lower() in self._available_lower for tool in recipe.required_tools)
+
+@dataclass(slots=True)
+class AgentState:
+    """State maintained across agent steps.
 
-class AgentState(BaseModel):
-    """State maintained across agent steps."""
+    A plain dataclass rather than a Pydantic model: it is only passed between
+    graph nodes and never crosses the API boundary, so it needs no validation.
+    """
     query: str
     is_cooking_related: bool = False
+    classification_failed: bool = False
     needs_research: bool = False
-    research_results: List[str] = Field(default_factory=list)
+    research_results: List[str] = field(default_factory=list)
     recipe: Optional[Recipe] = None
-    reasoning_chain: List[str] = Field(default_factory=list)
-    final_response: Optional[str] = None 
\ No newline at end of file
+    reasoning_chain: List[str] = field(default_factory=list)
+    final_response: Optional[str] = None
\ No newline at end of file
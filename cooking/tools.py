@@ -1,82 +1,212 @@
-from typing import List, Optional
-import json
+from typing import List, Optional, Tuple
+import asyncio
+import re
+import orjson
 from langchain.tools import Tool
-#from langchain.chat_models import ChatOpenAI
-from langchain_community.chat_models import ChatOpenAI
-from duckduckgo_search import DDGS
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+import httpx
+from selectolax.lexbor import LexborHTMLParser
 from langchain.schema import HumanMessage
 from .prompts import (
-    QUERY_CLASSIFIER_PROMPT,
-    RESEARCH_NEEDED_PROMPT,
-    RECIPE_PARSER_PROMPT,
-    FINAL_RESPONSE_PROMPT,
-    GENERAL_COOKING_PROMPT
+    CLASSIFY_AND_RESEARCH_PREFIX,
+    CLASSIFY_AND_RESEARCH_SUFFIX,
+    BATCH_CLASSIFY_AND_RESEARCH_PREFIX,
+    BATCH_CLASSIFY_AND_RESEARCH_SUFFIX,
+    RECIPE_PARSER_PREFIX,
+    GENERAL_COOKING_PREFIX,
+    GENERAL_COOKING_SUFFIX,
+    final_response_prompt
 )
 from .models import Recipe, ToolSet
+from .cache import cached, query_key, results_key
+from .batcher import AdaptiveBatcher
 import logging
 
 logger = logging.getLogger(__name__)
 
-def search_recipes(query: str) -> List[str]:
-    """Search for recipes and cooking information using DuckDuckGo."""
-    with DDGS() as ddgs:
-        results = list(ddgs.text(f"recipe {query}", max_results=3))
-    return [result['body'] for result in results]
+DDG_SEARCH_URL = "https://html.duckduckgo.com/html/"
+DDG_MAX_RESULTS = 3
+DDG_TIMEOUT = 5
+DDG_QUERY_PREFIX = "recipe "
+DDG_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; CookingAssistant/1.0)"}
+SEARCH_CACHE_TTL = 60 * 60
 
-def classify_query(query: str, llm: ChatOpenAI) -> bool:
-    """Determine if a query is cooking-related."""
-    response = llm.invoke([HumanMessage(content=QUERY_CLASSIFIER_PROMPT.format(query=query))])
-    return response.content.lower().strip() == 'true'
+# Keyword vocabularies for classifying obvious queries without an LLM call
+COOKING_VOCAB = frozenset({
+    "recipe", "recipes", "cook", "cooking", "cooked", "bake", "baking", "baked",
+    "fry", "frying", "fried", "boil", "boiling", "boiled", "roast", "roasting",
+    "grill", "grilling", "saute", "sauté", "simmer", "steam", "poach", "braise",
+    "marinate", "knead", "whisk", "chop", "dice", "mince", "oven", "stovetop",
+    "skillet", "pan", "pot", "spatula", "ladle", "kitchen", "ingredient",
+    "ingredients", "tablespoon", "teaspoon", "dough", "bread", "pasta", "rice",
+    "noodles", "sauce", "soup", "stew", "salad", "risotto", "omelette", "pancakes",
+    "cake", "cookies", "pie", "dessert", "breakfast", "lunch", "dinner", "meal",
+    "egg", "eggs", "chicken", "beef", "pork", "fish", "salmon", "steak", "tofu",
+    "vegetables", "garlic", "onion", "flour", "sugar", "butter", "cheese"
+})
+RESEARCH_VOCAB = frozenset({"recipe", "recipes", "make", "ingredients"})
+HOW_TO_PATTERN = re.compile(r"\bhow (to|do i|do you|can i|should i)\b")
+NON_COOKING_PATTERN = re.compile(
+    r"\b(weather|forecast|stock (price|market)s?|bitcoin|crypto(currency)?|election|"
+    r"football|basketball|soccer|movie|lyrics|homework|programming|javascript|"
+    r"capital of|population|horoscope|news)\b"
+)
+_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+def _parse_search_results(html: str, max_results: int) -> List[str]:
+    """Extract result snippets from a DuckDuckGo HTML results page."""
+    snippets = []
+    for result in LexborHTMLParser(html).css("div.result"):
+        if "result--ad" in (result.attributes.get("class") or ""):
+            continue
+        snippet = result.css_first(".result__snippet")
+        if snippet is None:
+            continue
+        text = " ".join(snippet.text().split())
+        if text:
+            snippets.append(text)
+            if len(snippets) == max_results:
+                break
+    return snippets
+
+async def search_recipes(query: str, http_client: httpx.AsyncClient) -> List[str]:
+    """Search for recipes and cooking information using DuckDuckGo.
+    
+    http_client is the worker's shared connection pool, so repeated searches
+    reuse an open connection instead of paying a TLS handshake each time.
+    """
+    response = await http_client.get(
+        DDG_SEARCH_URL,
+        params={"q": DDG_QUERY_PREFIX + query},
+        headers=DDG_HEADERS,
+        timeout=DDG_TIMEOUT
+    )
+    response.raise_for_status()
+    return _parse_search_results(response.text, DDG_MAX_RESULTS)
+
+def keyword_classify(query: str) -> Optional[Tuple[bool, bool]]:
+    """Classify clearly off-topic queries and clear recipe requests from keywords.
+    
+    Returns (is_cooking, needs_research) like classify_and_route, or None when
+    the keywords are inconclusive and the LLM has to decide. Cooking queries
+    are only settled here when they clearly ask for a recipe or method, so
+    the LLM still decides whether other cooking questions need research.
+    """
+    query = query.lower()
+    words = set(_WORD_PATTERN.findall(query))
+    cooking_hits = len(words & COOKING_VOCAB)
+    if NON_COOKING_PATTERN.search(query):
+        return (False, False) if cooking_hits == 0 else None
+    if cooking_hits >= 2 and (not words.isdisjoint(RESEARCH_VOCAB) or HOW_TO_PATTERN.search(query)):
+        return True, True
+    return None
+
+def _strip_code_fence(content: str) -> str:
+    """Remove a surrounding ```json fence from an LLM response."""
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return content.strip()
+
+def _load_decision(content: str) -> dict:
+    """Decode a JSON decision object from an LLM response."""
+    return dict(orjson.loads(_strip_code_fence(content)))
 
-def needs_research(query: str, llm: ChatOpenAI) -> bool:
-    """Determine if research is needed to answer the query."""
-    response = llm.invoke([HumanMessage(content=RESEARCH_NEEDED_PROMPT.format(query=query))])
-    return response.content.lower().strip() == 'true'
+def _decision_flags(decision: dict) -> Tuple[bool, bool]:
+    """Turn a {"cooking": ..., "research": ...} decision into two booleans."""
+    is_cooking = decision.get("cooking") is True
+    return is_cooking, is_cooking and decision.get("research") is True
 
-def parse_recipe(research_results: List[str], llm: ChatOpenAI) -> Optional[Recipe]:
-    """Parse research results into a structured recipe."""
+def _parse_decision(content: str) -> Tuple[bool, bool]:
+    """Parse a {"cooking": ..., "research": ...} decision into two booleans."""
+    return _decision_flags(_load_decision(content))
+
+async def classify_and_route(query: str, llm: ChatOpenAI) -> Optional[Tuple[bool, bool]]:
+    """Determine if a query is cooking-related and whether it needs research.
+    
+    Returns None when the LLM's answer can't be parsed, so the failure isn't
+    cached like a real decision.
+    """
+    response = await llm.ainvoke([HumanMessage(content=CLASSIFY_AND_RESEARCH_PREFIX + query + CLASSIFY_AND_RESEARCH_SUFFIX)])
     try:
-        response = llm.invoke([HumanMessage(content=RECIPE_PARSER_PROMPT.format(
-            research_results="\n".join(research_results)
-        ))])
-        
-        # Clean the response content to ensure valid JSON
-        content = response.content.strip()
-        if content.startswith('```json'):
-            content = content[7:]
-        if content.endswith('```'):
-            content = content[:-3]
-        content = content.strip()
-        
-        recipe_dict = json.loads(content)
-        return Recipe(**recipe_dict)
-    except (json.JSONDecodeError, ValueError) as e:
-        print(f"Error parsing recipe: {str(e)}")
+        return _parse_decision(response.content)
+    except (TypeError, ValueError) as e:
+        logger.error("Error parsing classification: %s", e)
+        return None
+
+async def classify_and_route_batch(queries: List[str], llm: ChatOpenAI) -> List[Optional[Tuple[bool, bool]]]:
+    """Classify several queries with a single LLM call.
+
+    Queries are sent as numbered JSON strings and every answer must echo its
+    query's number. Falls back to one call per query if the batched answer
+    can't be matched up with the queries.
+    """
+    if len(queries) == 1:
+        return [await classify_and_route(queries[0], llm)]
+
+    numbered = "\n".join(
+        f"{i}. {orjson.dumps(' '.join(query.split())).decode()}" for i, query in enumerate(queries, 1)
+    )
+    response = await llm.ainvoke([HumanMessage(
+        content=BATCH_CLASSIFY_AND_RESEARCH_PREFIX + numbered + BATCH_CLASSIFY_AND_RESEARCH_SUFFIX
+    )])
+    lines = [line for line in _strip_code_fence(response.content).splitlines() if line.strip()]
+    try:
+        if len(lines) != len(queries):
+            raise ValueError(f"Expected {len(queries)} decisions, got {len(lines)}")
+        decisions = [_load_decision(line) for line in lines]
+        for i, decision in enumerate(decisions, 1):
+            if decision.get("i") != i:
+                raise ValueError(f"Expected decision {i}, got {decision.get('i')!r}")
+        return [_decision_flags(decision) for decision in decisions]
+    except (TypeError, ValueError) as e:
+        logger.warning("Falling back to per-query classification: %s", e)
+        return list(await asyncio.gather(*(classify_and_route(query, llm) for query in queries)))
+
+async def parse_recipe(research_results: List[str], recipe_llm: Runnable) -> Optional[Recipe]:
+    """Parse research results into a structured recipe.
+    
+    recipe_llm is a chat model bound to the Recipe JSON schema, so the output
+    is guaranteed to be well-formed JSON and only field validation can fail.
+    """
+    try:
+        return await recipe_llm.ainvoke([HumanMessage(
+            content=RECIPE_PARSER_PREFIX + "\n".join(research_results)
+        )])
+    except ValueError as e:
+        logger.error("Error parsing recipe: %s", e)
         return None
 
-def generate_cooking_response(
+async def generate_cooking_response(
     query: str,
     recipe: Optional[Recipe],
     toolset: ToolSet,
     llm: ChatOpenAI
 ) -> str:
-    """Generate the final response to a cooking query."""
+    """Generate the final response to a cooking query.
+
+    The LLM output is consumed as a stream so callers running the graph with
+    astream_events can forward tokens to the client as they are generated.
+    """
     try:
         can_cook = True if recipe and toolset.can_cook_recipe(recipe) else False
         
         if recipe:
             # We have a specific recipe to share
-            response = llm.invoke([HumanMessage(content=FINAL_RESPONSE_PROMPT.format(
+            prompt = final_response_prompt(
                 query=query,
-                recipe=recipe.model_dump_json(),
+                recipe=recipe.json_cache,
                 can_cook=can_cook,
                 available_tools=toolset.available_tools
-            ))])
+            )
         else:
             # General cooking advice
             if "how to cook" in query.lower():
                 # For general "how to cook X" queries, provide basic cooking instructions
-                response = llm.invoke([HumanMessage(content=f"""You are a helpful cooking assistant providing basic cooking instructions.
+                prompt = f"""You are a helpful cooking assistant providing basic cooking instructions.
 The user wants to know how to cook {query.lower().replace('how to cook ', '')}.
 Provide clear, step-by-step instructions that use their available tools: {toolset.available_tools}.
 Format your response in markdown and include:
@@ -86,46 +216,67 @@ Format your response in markdown and include:
 4. Tips for best results
 5. How to tell when it's done
 
-Keep the instructions simple and suitable for beginners.""")])
+Keep the instructions simple and suitable for beginners."""
             else:
                 # For other general cooking queries
-                response = llm.invoke([HumanMessage(content=GENERAL_COOKING_PROMPT.format(query=query))])
+                prompt = GENERAL_COOKING_PREFIX + query + GENERAL_COOKING_SUFFIX
         
-        if not response or not response.content:
+        chunks = []
+        async for chunk in llm.astream([HumanMessage(content=prompt)]):
+            chunks.append(chunk.content)
+        content = "".join(chunks).strip()
+        
+        if not content:
             raise ValueError("Failed to generate response content")
             
-        return response.content.strip()
+        return content
         
     except Exception as e:
-        logger.error(f"Error generating cooking response: {str(e)}")
+        logger.error("Error generating cooking response: %s", e)
         raise
 
-def create_tools(llm: ChatOpenAI) -> List[Tool]:
-    """Create the tool set for the cooking assistant."""
+def create_tools(llm: ChatOpenAI, http_client: httpx.AsyncClient) -> List[Tool]:
+    """Create the tool set for the cooking assistant.
+
+    Classification and recipe parsing are pure functions of their inputs, so
+    their results are cached per tool set to skip repeated LLM round-trips.
+    Search results are cached for an hour. Concurrent classifications that
+    miss the cache are micro-batched into a single LLM call; obvious queries
+    should be settled with keyword_classify before reaching this tool.
+    """
+    classify_batcher = AdaptiveBatcher(
+        lambda queries: classify_and_route_batch(queries, llm),
+        max_batch_size=16,
+        max_latency_ms=20
+    )
+    cached_classify = cached(classify_batcher.submit, key=query_key)
+
+    recipe_llm = llm.with_structured_output(Recipe, method="json_schema")
+    cached_parse = cached(lambda r: parse_recipe(r, recipe_llm), key=results_key, maxsize=1024)
+    cached_search = cached(lambda q: search_recipes(q, http_client), key=query_key, maxsize=1024, ttl=SEARCH_CACHE_TTL)
     return [
         Tool(
-            name="classify_query",
-            func=lambda q: classify_query(q, llm),
-            description="Determine if a query is cooking-related"
-        ),
-        Tool(
-            name="needs_research",
-            func=lambda q: needs_research(q, llm),
-            description="Determine if research is needed to answer the query"
+            name="classify_and_route",
+            func=None,
+            coroutine=cached_classify,
+            description="Determine if a query is cooking-related and whether research is needed"
         ),
         Tool(
             name="search_recipes",
-            func=search_recipes,
+            func=None,
+            coroutine=cached_search,
             description="Search for recipes and cooking information"
         ),
         Tool(
             name="parse_recipe",
-            func=lambda r: parse_recipe(r, llm),
+            func=None,
+            coroutine=cached_parse,
             description="Parse research results into a structured recipe"
         ),
         Tool(
             name="generate_response",
-            func=lambda q, r, t: generate_cooking_response(q, r, t, llm),
+            func=None,
+            coroutine=lambda q, r, t: generate_cooking_response(q, r, t, llm),
             description="Generate the final response to a cooking query"
         )
     ] 
\ No newline at end of file
@@ -1,9 +1,9 @@
 import streamlit as st
-import requests
-import json
+import httpx
+import orjson
 import os
 import platform
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 
 # Print debugging information
 print("Starting Streamlit app...")
@@ -17,19 +17,47 @@ else:
 BACKEND_URL = os.getenv("BACKEND_URL", default_backend)
 print(f"Using backend URL: {BACKEND_URL}")
 
-def ask_cooking_question(query: str) -> Dict[str, Any]:
-    """Send query to FastAPI backend and get response."""
+def get_http_client() -> httpx.Client:
+    """Return the session's HTTP client, creating it on first use.
+    
+    The client lives in session state so its connection to the backend is
+    kept alive across reruns instead of reconnecting for every question.
+    """
+    if "http" not in st.session_state:
+        st.session_state.http = httpx.Client(base_url=BACKEND_URL, timeout=30, http2=True)
+    return st.session_state.http
+
+def stream_cooking_question(query: str, result: Dict[str, Any]) -> Iterator[str]:
+    """Send query to FastAPI backend and yield the answer as it streams in.
+    
+    The final event from the backend (response, relevance and reasoning
+    chain) is stored in result once the stream completes.
+    """
     try:
         print(f"Making request to backend at: {BACKEND_URL}")
-        response = requests.post(
-            f"{BACKEND_URL}/cooking/query",
-            json={"query": query},
-            timeout=30
-        )
-        print(f"Backend response status: {response.status_code}")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.ConnectionError as e:
+        with get_http_client().stream(
+            "POST",
+            "/cooking/query/stream",
+            json={"query": query}
+        ) as response:
+            print(f"Backend response status: {response.status_code}")
+            response.raise_for_status()
+            streamed = False
+            for line in response.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = orjson.loads(line[len("data: "):])
+                if event["type"] == "token":
+                    streamed = True
+                    yield event["content"]
+                    continue
+                result.update(event)
+                if event["type"] == "error":
+                    st.error(event.get("response", "Error processing query"))
+                elif not streamed:
+                    # Responses that skip the LLM (e.g. off-topic queries) arrive whole
+                    yield event.get("response", "No response received")
+    except httpx.ConnectError as e:
         print(f"Connection error: {str(e)}")
         error_msg = f"""Could not connect to backend at {BACKEND_URL}. 
         Please make sure:
@@ -39,11 +67,9 @@ def ask_cooking_question(query: str) -> Dict[str, Any]:
         
         Error details: {str(e)}"""
         st.error(error_msg)
-        return None
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Request error: {str(e)}")
         st.error(f"Error communicating with backend: {str(e)}")
-        return None
 
 # Set page config with dark theme
 st.set_page_config(
@@ -188,15 +214,10 @@ if st.button("Ask Question"):
         st.warning("Please enter a question!")
     else:
         with st.spinner("Cooking up an answer..."):
-            response = ask_cooking_question(query)
+            st.markdown("### Answer:")
+            response = {}
+            st.write_stream(stream_cooking_question(query, response))
             if response:
-                st.markdown("### Answer:")
-                st.markdown(f"""
-                <div class="response-box">
-                    {response.get("response", "No response received")}
-                </div>
-                """, unsafe_allow_html=True)
-                
                 # Show reasoning chain in expander
                 with st.expander("See reasoning chain"):
                     reasoning_chain = response.get("reasoning_chain", [])
@@ -208,4 +229,4 @@ if st.button("Ask Question"):
                             </div>
                             """, unsafe_allow_html=True)
                     else:
-                        st.write("No reasoning chain available") 
\ No newline at end of file
+                        st.write("No reasoning chain available")
\ No newline at end of file